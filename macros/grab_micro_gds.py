@@ -1,8 +1,17 @@
 import re
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import json
+import time
+import hashlib
+import struct
+import concurrent.futures
 import zipfile
+import tempfile
 import shutil
+import posixpath
 import gdstk
 import yaml
 
@@ -15,124 +24,208 @@ HEADERS = {
     "Accept": "application/vnd.github.v3+json"
 }
 
-def download_tt_submission_artifact(repo_url, output_filename="tt_submission.zip"):
+# Patterns used to rename the module / macro in the Verilog and LEF files
+_MODULE_RE = re.compile(r"^([ \t]*)module[ \t]+\w+", re.MULTILINE)
+_MACRO_RE = re.compile(r"^([ \t]*)MACRO[ \t]+(\w+)", re.MULTILINE)
+_LEF_NAME_RE = re.compile(r"^(?P<indent>[ \t]*)(?P<kw>MACRO|END|FOREIGN)[ \t]+(?P<name>\w+)", re.MULTILINE)
+
+# GDSII record types (record type byte followed by data type byte)
+_GDS_BGNSTR = 0x0502
+_GDS_STRNAME = 0x0606
+_GDS_ENDLIB = 0x0400
+
+def rate_limit_delay(response):
+    """
+    Returns how many seconds to wait before GitHub accepts requests again, or None if the rate limit is not an issue.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return max(0, int(retry_after))
+        except ValueError:
+            return 60
+
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    reset = response.headers.get("X-RateLimit-Reset")
+    if remaining is None or reset is None or int(remaining) > 1:
+        return None
+
+    return max(0, int(reset) - time.time())
+
+def wait_for_rate_limit(response, *args, **kwargs):
+    """
+    Response hook that waits out GitHub rate limits.
+
+    A rate-limited 403/429 response is re-sent once the limit resets. Other responses only trigger
+    a wait when the limit is (almost) exhausted, so the next request does not hit it.
+    """
+    delay = rate_limit_delay(response)
+    if delay is None:
+        return
+
+    if response.status_code in (403, 429):
+        print(f"GitHub rate limit hit, retrying in {delay:.0f}s.")
+        time.sleep(delay)
+
+        # Release the connection of the rate-limited response before sending the request again
+        response.content
+        response.close()
+        return response.connection.send(response.request, **kwargs)
+
+    if delay > 0:
+        print(f"GitHub rate limit almost exhausted, waiting {delay:.0f}s for it to reset.")
+        time.sleep(delay)
+
+# Shared session so connections to GitHub are pooled and kept alive between calls,
+# with transient server errors retried and rate limits waited out instead of aborting the whole run.
+# 403s are left to wait_for_rate_limit, since only some of them are rate limits.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=1.0,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+))
+SESSION.hooks["response"].append(wait_for_rate_limit)
+
+# On-disk cache of GitHub API responses, revalidated with ETag / If-None-Match
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "gh")
+CACHE_TTL = 24 * 3600
+
+def cached_get(url, params=None):
+    """
+    Performs a GET request against the GitHub API, reusing a cached body when GitHub answers 304 Not Modified.
+
+    Cache entries older than CACHE_TTL are discarded and fetched again unconditionally.
+
+    Parameters:
+        url (str): The API URL to fetch.
+        params (dict): Optional query parameters.
+
+    Returns:
+        dict: The decoded JSON body, or None if the request failed.
     """
-    Downloads the latest GitHub Actions artifact named 'tt_submission' from a public repository.
+    key = hashlib.sha256(json.dumps([url, params], sort_keys=True).encode()).hexdigest()
+    cache_file = os.path.join(CACHE_DIR, f"{key}.json")
+
+    cached = None
+    if os.path.exists(cache_file) and time.time() - os.path.getmtime(cache_file) < CACHE_TTL:
+        with open(cache_file, "r") as file:
+            cached = json.load(file)
+
+    headers = dict(HEADERS)
+    if cached:
+        headers["If-None-Match"] = cached["etag"]
+
+    response = SESSION.get(url, headers=headers, params=params)
+    if response.status_code == 304 and cached:
+        return cached["body"]
+    if response.status_code != 200:
+        return None
+
+    body = response.json()
+    etag = response.headers.get("ETag")
+    if etag:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_file = f"{cache_file}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump({"etag": etag, "body": body}, file)
+        os.replace(tmp_file, cache_file)
+
+    return body
+
+def download_and_extract(repo_url, output_dir, new_basename):
+    """
+    Downloads the latest GitHub Actions artifact named 'tt_submission' from a public repository
+    and extracts its GDS, LEF and Verilog files, without writing the zip archive to disk.
     
     Parameters:
         repo_url (str): The GitHub repository URL (e.g., "https://github.com/user/repo").
-        output_filename (str): The filename to save the artifact as (default: "tt_submission.zip").
+        output_dir (str): The directory to extract the files into.
+        new_basename (str): New base name for the extracted files.
     
     Returns:
-        bool: True if the artifact was successfully downloaded, False otherwise.
+        bool: True if the artifact was successfully downloaded and extracted, False otherwise.
     """
     # Extract owner and repo name from URL
-    match = re.match(r"https://github.com/([^/]+)/([^/]+)", repo_url)
-    if not match:
+    if not repo_url.startswith("https://github.com/"):
         print("Invalid GitHub repository URL.")
         return False
-    
-    owner, repo = match.groups()
 
-    # Get the latest workflow runs
-    runs_url = f"https://api.github.com/repos/{owner}/{repo}/actions/runs"
-    runs_response = requests.get(runs_url, headers=HEADERS)
-    if runs_response.status_code != 200:
-        print("Failed to fetch workflow runs.")
+    owner, _, rest = repo_url.removeprefix("https://github.com/").partition("/")
+    repo = rest.split("/", 1)[0]
+    if not owner or not repo:
+        print("Invalid GitHub repository URL.")
         return False
 
-    runs = runs_response.json().get("workflow_runs", [])
-    if not runs:
-        print("No workflow runs found.")
+    # Ask only for the 'tt_submission' artifacts, newest first, instead of walking every workflow run
+    artifacts_url = f"https://api.github.com/repos/{owner}/{repo}/actions/artifacts"
+    params = {"name": "tt_submission", "per_page": 10}
+    artifacts_body = cached_get(artifacts_url, params)
+    if artifacts_body is None:
+        print("Failed to fetch artifacts.")
         return False
 
-    # Iterate over workflow runs to find the artifact
-    for run in runs:
-        artifacts_url = f"https://api.github.com/repos/{owner}/{repo}/actions/runs/{run['id']}/artifacts"
-        artifacts_response = requests.get(artifacts_url, headers=HEADERS)
-        
-        if artifacts_response.status_code != 200:
+    artifacts = artifacts_body.get("artifacts", [])
+    for artifact in artifacts:
+        if artifact.get("expired"):
             continue
-        
-        artifacts = artifacts_response.json().get("artifacts", [])
-        for artifact in artifacts:
-            if artifact["name"] == "tt_submission":
-                print(f"Found artifact: {artifact['name']} (ID: {artifact['id']})")
-                
-                # Download the artifact
-                download_url = artifact["archive_download_url"]
-                artifact_response = requests.get(download_url, headers=HEADERS, stream=True)
-                
-                if artifact_response.status_code == 200:
-                    with open(output_filename, "wb") as file:
-                        for chunk in artifact_response.iter_content(chunk_size=8192):
-                            file.write(chunk)
-                    print(f"Downloaded artifact to {output_filename}")
-                    return True
-                else:
-                    print("Failed to download artifact.")
-                    print(f"HTTP {artifact_response.status_code}: {artifact_response.text}")
-                    return False
-    
+
+        print(f"Found artifact: {artifact['name']} (ID: {artifact['id']})")
+
+        # Download the artifact
+        download_url = artifact["archive_download_url"]
+        artifact_response = SESSION.get(download_url, headers=HEADERS, stream=True)
+
+        if artifact_response.status_code == 200:
+            # ZipFile needs a seekable file, so buffer the archive in memory (spilling to disk if large)
+            with tempfile.SpooledTemporaryFile(max_size=64 << 20) as buffer:
+                for chunk in artifact_response.iter_content(chunk_size=1024 * 1024):
+                    buffer.write(chunk)
+                buffer.seek(0)
+
+                with zipfile.ZipFile(buffer, "r") as zip_ref:
+                    grab_relevant_submission_files(zip_ref, output_dir, new_basename)
+            print(f"Downloaded and extracted artifact to {output_dir}")
+            return True
+        else:
+            print("Failed to download artifact.")
+            print(f"HTTP {artifact_response.status_code}: {artifact_response.text}")
+            return False
+
     print("No 'tt_submission' artifact found.")
     return False
 
-def unzip_tt_submission_artifact(input_filename="tt_submission.zip", output_dir="tt_submission"):
-    """
-    Unzips the 'tt_submission' artifact into a directory.
-    
-    Parameters:
-        input_filename (str): The filename of the artifact to unzip (default: "tt_submission.zip").
-        output_dir (str): The directory to unzip the artifact into (default: "tt_submission").
-    
-    Returns:
-        bool: True if the artifact was successfully unzipped, False otherwise.
-    """
-    
-    
-    if not os.path.exists(input_filename):
-        print(f"File not found: {input_filename}")
-        return False
-    
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    with zipfile.ZipFile(input_filename, "r") as zip_ref:
-        zip_ref.extractall(output_dir)
-    
-    print(f"Unzipped artifact to {output_dir}")
-
-def grab_relevant_submission_files(search_directory, output_directory, new_basename):
+def grab_relevant_submission_files(zip_ref, output_directory, new_basename, search_directory="tt_submission"):
     """
-    Grab the GDS, LEF, and Verilog (.v) files from the search directory and copy them to the output directory.
+    Grab the GDS, LEF, and Verilog (.v) files from the search directory of the artifact and extract them to the output directory.
     Rename the files to have the specified new_basename while keeping their original extensions.
 
-    :param search_directory: Directory to search for relevant files.
-    :param output_directory: Directory where the files should be copied.
-    :param new_basename: New base name for the copied files.
+    :param zip_ref: Open zipfile.ZipFile of the artifact.
+    :param output_directory: Directory where the files should be extracted.
+    :param new_basename: New base name for the extracted files.
+    :param search_directory: Directory inside the artifact to search for relevant files.
     """
-    if not os.path.exists(output_directory):
-        os.makedirs(output_directory)  # Ensure output directory exists
-
-    valid_extensions = {".lef", ".gds", ".v"}
+    os.makedirs(output_directory, exist_ok=True)  # Ensure output directory exists
 
-    for file in os.listdir(search_directory):
-        file_path = os.path.join(search_directory, file)
-        file_ext = os.path.splitext(file)[1]
+    valid_extensions = (".lef", ".gds", ".v")
 
-        if file_ext in valid_extensions:
-            print(f"Found relevant file: {file}")
+    for info in zip_ref.infolist():
+        directory, name = posixpath.split(info.filename)
+        if directory == search_directory and name.endswith(valid_extensions) and not info.is_dir():
+            print(f"Found relevant file: {name}")
+            file_ext = name[name.rindex("."):]
             new_file = os.path.join(output_directory, f"{new_basename}{file_ext}")
 
-            # Copy instead of move to preserve the original files
-            shutil.copy2(file_path, new_file)
-            print(f"Copied {file} to {new_file}")
-
-def clean_up(directory, zip_file):
-    if os.path.exists(zip_file):
-        os.remove(zip_file)
-    if os.path.exists(directory):
-        shutil.rmtree(directory)
+            # Only the relevant files are extracted, straight to their final name
+            with zip_ref.open(info) as src, open(new_file, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            print(f"Extracted {name} to {new_file}")
 
 def rename_top_cell(input_gds: str, output_gds: str, new_top_name: str):
     """
@@ -146,14 +239,12 @@ def rename_top_cell(input_gds: str, output_gds: str, new_top_name: str):
     Returns:
     None
     """
-    # Load the GDS file
+    # Load the GDS file, only to identify the top cell
     lib = gdstk.read_gds(input_gds)
 
     # Identify the top cell (the one not referenced by any other cell)
-    all_cells = {cell.name: cell for cell in lib.cells}
-    referenced_cells = {ref.cell.name for cell in lib.cells for ref in cell.references if isinstance(ref, gdstk.Reference)}
-
-    top_cells = [cell for name, cell in all_cells.items() if name not in referenced_cells]
+    referenced_cells = {ref.cell.name for cell in lib.cells for ref in cell.references}
+    top_cells = [cell for cell in lib.cells if cell.name not in referenced_cells]
 
     if not top_cells:
         raise ValueError("No top cell found in the GDS file.")
@@ -161,21 +252,79 @@ def rename_top_cell(input_gds: str, output_gds: str, new_top_name: str):
     if len(top_cells) > 1:
         print("Warning: Multiple top cells found. Renaming the first one detected.")
 
-    top_cell = top_cells[0]
-    old_top_name = top_cell.name
+    old_top_name = top_cells[0].name
+    del lib
+
+    # Patch the STRNAME record of the top cell instead of re-serializing the whole library
+    new_payload = new_top_name.encode("ascii")
+    if len(new_payload) % 2:
+        new_payload += b"\0"
+    new_record = struct.pack(">HH", 4 + len(new_payload), _GDS_STRNAME) + new_payload
+
+    with open(input_gds, "rb") as file:
+        offset, old_length = _find_gds_strname(file, old_top_name)
+
+    if old_length == len(new_record):
+        if input_gds != output_gds:
+            shutil.copyfile(input_gds, output_gds)
+        with open(output_gds, "r+b") as file:
+            file.seek(offset)
+            file.write(new_record)
+    else:
+        # The record size changes, so splice the new record into a copy of the input,
+        # streaming it in bounded chunks rather than holding the layout in memory
+        tmp_gds = f"{output_gds}.tmp"
+        with open(input_gds, "rb") as src, open(tmp_gds, "wb") as out:
+            remaining = offset
+            while remaining:
+                chunk = src.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                out.write(chunk)
+                remaining -= len(chunk)
+            out.write(new_record)
+            src.seek(offset + old_length)
+            shutil.copyfileobj(src, out, 1 << 20)
+        os.replace(tmp_gds, output_gds)
 
-    # Rename the top cell
-    top_cell.name = new_top_name
+    print(f"Renamed top cell '{old_top_name}' to '{new_top_name}' and saved to '{output_gds}'.")
 
-    # Create a new GDS library and add all cells to it
-    new_lib = gdstk.Library(name=lib.name)
-    for cell in lib.cells:
-        new_lib.add(cell)
+def _find_gds_strname(file, cell_name):
+    """
+    Finds the STRNAME record of a cell in a GDSII file.
 
-    # Save the modified GDS file
-    new_lib.write_gds(output_gds)
+    Parameters:
+    file: GDSII file opened in binary mode.
+    cell_name (str): Name of the cell to look for.
 
-    print(f"Renamed top cell '{old_top_name}' to '{new_top_name}' and saved to '{output_gds}'.")
+    Returns:
+    tuple: The offset and length of the STRNAME record.
+    """
+    name = cell_name.encode("ascii")
+    file.seek(0)
+    previous_type = None
+
+    while True:
+        offset = file.tell()
+        header = file.read(4)
+        if len(header) < 4:
+            break
+
+        length, record_type = struct.unpack(">HH", header)
+        if length < 4:
+            break
+
+        if record_type == _GDS_STRNAME and previous_type == _GDS_BGNSTR:
+            if file.read(length - 4).rstrip(b"\0") == name:
+                return offset, length
+        else:
+            file.seek(length - 4, os.SEEK_CUR)
+
+        if record_type == _GDS_ENDLIB:
+            break
+        previous_type = record_type
+
+    raise ValueError(f"Cell '{cell_name}' not found in the GDS file.")
 
 def rename_verilog_module(input_verilog_file, output_verilog_file, new_module_name):
     """
@@ -190,13 +339,13 @@ def rename_verilog_module(input_verilog_file, output_verilog_file, new_module_na
     None
     """
     with open(input_verilog_file, "r") as file:
-        lines = file.readlines()
+        content = file.read()
+
+    # Only the first module declaration is the one to rename, so stop scanning after it
+    content = _MODULE_RE.sub(lambda m: f"{m[1]}module {new_module_name}", content, count=1)
 
     with open(output_verilog_file, "w") as file:
-        for line in lines:
-            if line.strip().startswith("module "):
-                line = re.sub(r"module\s+\w+", f"module {new_module_name}", line)
-            file.write(line)
+        file.write(content)
 
     print(f"Renamed module in '{input_verilog_file}' to '{new_module_name}' and saved to '{output_verilog_file}'.")
 
@@ -205,22 +354,17 @@ def update_lef_file(input_lef_file,output_lef_file, new_name):
         Update the LEF file to have the new name for the cell.
     """
     with open(input_lef_file, "r") as file:
-        lines = file.readlines()
+        content = file.read()
+
+    old_names = {m[2] for m in _MACRO_RE.finditer(content)}
+
+    content = _LEF_NAME_RE.sub(
+        lambda m: f"{m['indent']}{m['kw']} {new_name}" if m["name"] in old_names else m[0],
+        content
+    )
 
-    old_name = ""
     with open(output_lef_file, "w") as file:
-        for line in lines:
-            if line.strip().startswith("MACRO "):
-                old_name = line.split()[1]
-                line = re.sub(r"MACRO\s+\w+", f"MACRO {new_name}", line)
-                
-            if line.strip().startswith("END "):
-                if line.split()[1] == old_name:
-                    line = re.sub(r"END\s+\w+", f"END {new_name}", line)
-            if line.strip().startswith("FOREIGN"):
-                if line.split()[1] == old_name:
-                    line = re.sub(r"FOREIGN\s+\w+", f"FOREIGN {new_name}", line)
-            file.write(line)
+        file.write(content)
 
     print(f"Renamed module in '{input_lef_file}' to '{new_name}' and saved to '{output_lef_file}'.")
 
@@ -233,23 +377,44 @@ def extract_micro_tiles(info_yaml = "../info.yaml"):
     micro_tiles = info.get("project", {}).get("micro_tiles", [])
     return micro_tiles
 
-giturl_1, giturl_2, giturl_3, giturl_4 = extract_micro_tiles()
-top_gds_name1 = "tt_um_micro1"
-top_gds_name2 = "tt_um_micro2"
-top_gds_name3 = "tt_um_micro3"
-top_gds_name4 = "tt_um_micro4"
-
-for i, (giturl, top_gds_name) in enumerate(zip(
-    [giturl_1, giturl_2, giturl_3, giturl_4],
-    [top_gds_name1, top_gds_name2, top_gds_name3, top_gds_name4]
-)):
-    zip_filename = f"{top_gds_name}.zip"
-    dir_name = top_gds_name
-
-    download_tt_submission_artifact(giturl, zip_filename)
-    unzip_tt_submission_artifact(zip_filename, dir_name)
-    grab_relevant_submission_files(f"{dir_name}/tt_submission", ".", top_gds_name)
-    rename_top_cell(f"{top_gds_name}.gds", f"{top_gds_name}.gds", top_gds_name)
-    update_lef_file(f"{top_gds_name}.lef", f"{top_gds_name}.lef", top_gds_name)
-    rename_verilog_module(f"{top_gds_name}.v", f"{top_gds_name}.v", top_gds_name)
-    clean_up(dir_name, zip_filename)
+def process_one(giturl, top_gds_name):
+    """
+    Download, extract and rename the submission files for a single micro tile.
+
+    Parameters:
+    giturl (str): The GitHub repository URL of the micro tile.
+    top_gds_name (str): Name to give the top cell, LEF macro and Verilog module.
+
+    Returns:
+    None
+    """
+    if not download_and_extract(giturl, ".", top_gds_name):
+        raise RuntimeError(f"Failed to fetch tt_submission for {giturl}")
+
+    # The GDS, LEF and Verilog renames touch independent files, so run them side by side
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as ex:
+        futures = [
+            ex.submit(rename_top_cell, f"{top_gds_name}.gds", f"{top_gds_name}.gds", top_gds_name),
+            ex.submit(update_lef_file, f"{top_gds_name}.lef", f"{top_gds_name}.lef", top_gds_name),
+            ex.submit(rename_verilog_module, f"{top_gds_name}.v", f"{top_gds_name}.v", top_gds_name),
+        ]
+
+    # Surface any error raised by the renames
+    for future in futures:
+        future.result()
+
+if __name__ == "__main__":
+    giturl_1, giturl_2, giturl_3, giturl_4 = extract_micro_tiles()
+    top_gds_name1 = "tt_um_micro1"
+    top_gds_name2 = "tt_um_micro2"
+    top_gds_name3 = "tt_um_micro3"
+    top_gds_name4 = "tt_um_micro4"
+
+    tasks = list(zip(
+        [giturl_1, giturl_2, giturl_3, giturl_4],
+        [top_gds_name1, top_gds_name2, top_gds_name3, top_gds_name4]
+    ))
+
+    # Each tile writes its own output files, so they can be processed in parallel
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(tasks), 3 * (os.cpu_count() or 1))) as ex:
+        list(ex.map(lambda p: process_one(*p), tasks))
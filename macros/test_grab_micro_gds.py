@@ -0,0 +1,158 @@
+import http.server
+import threading
+import time
+
+import gdstk
+import pytest
+import requests
+
+import grab_micro_gds
+
+
+LEF = """VERSION 5.7 ;
+MACRO tt_um_old
+  CLASS BLOCK ;
+  FOREIGN tt_um_old ;
+  PIN VGND
+    PORT
+      LAYER met4 ;
+    END
+  END VGND
+  OBS
+      LAYER met1 ;
+  END
+END tt_um_old
+END LIBRARY
+"""
+
+
+def test_update_lef_file_renames_macro_after_bare_end(tmp_path):
+    lef = tmp_path / "tt_um_old.lef"
+    lef.write_text(LEF)
+
+    grab_micro_gds.update_lef_file(str(lef), str(lef), "tt_um_micro1")
+
+    assert lef.read_text() == LEF.replace("tt_um_old", "tt_um_micro1")
+
+
+def test_rename_verilog_module(tmp_path):
+    verilog = tmp_path / "tt_um_old.v"
+    verilog.write_text("// netlist\nmodule tt_um_old (\n  input clk\n);\nendmodule\n")
+
+    grab_micro_gds.rename_verilog_module(str(verilog), str(verilog), "tt_um_micro1")
+
+    assert "module tt_um_micro1 (" in verilog.read_text()
+
+
+
+def _write_gds(path):
+    lib = gdstk.Library()
+    sub = lib.new_cell("sub")
+    sub.add(gdstk.rectangle((0, 0), (1, 2), layer=1))
+    top = lib.new_cell("tt_um_old")
+    top.add(gdstk.Reference(sub, (5, 5)))
+    top.add(gdstk.rectangle((0, 0), (3, 4), layer=2))
+    lib.write_gds(str(path))
+
+
+def _check_gds(path, top_name):
+    lib = gdstk.read_gds(str(path))
+    cells = {cell.name: cell for cell in lib.cells}
+    assert set(cells) == {"sub", top_name}
+    assert [cell.name for cell in lib.top_level()] == [top_name]
+
+    top = cells[top_name]
+    assert [(ref.cell.name, tuple(ref.origin)) for ref in top.references] == [("sub", (5, 5))]
+    assert [(p.layer, p.bounding_box()) for p in top.polygons] == [(2, ((0, 0), (3, 4)))]
+    assert [(p.layer, p.bounding_box()) for p in cells["sub"].polygons] == [(1, ((0, 0), (1, 2)))]
+
+
+# "tt_um_new" pads to the same length as "tt_um_old" (overwrite), the others change it (splice)
+@pytest.mark.parametrize("new_name", ["tt_um_new", "tt_um_micro1", "tt_um_user_project"], ids=["overwrite", "splice", "splice-long"])
+def test_rename_top_cell_in_place(tmp_path, new_name):
+    gds = tmp_path / "tile.gds"
+    _write_gds(gds)
+
+    grab_micro_gds.rename_top_cell(str(gds), str(gds), new_name)
+
+    _check_gds(gds, new_name)
+    assert not (tmp_path / "tile.gds.tmp").exists()
+
+
+@pytest.mark.parametrize("new_name", ["tt_um_new", "tt_um_micro1"], ids=["overwrite", "splice"])
+def test_rename_top_cell_keeps_input(tmp_path, new_name):
+    input_gds = tmp_path / "input.gds"
+    output_gds = tmp_path / "output.gds"
+    _write_gds(input_gds)
+    original = input_gds.read_bytes()
+
+    grab_micro_gds.rename_top_cell(str(input_gds), str(output_gds), new_name)
+
+    _check_gds(output_gds, new_name)
+    assert input_gds.read_bytes() == original
+
+
+def _response(status_code, headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+    return response
+
+
+def test_rate_limit_delay_only_flags_rate_limits():
+    reset = str(int(time.time()) + 30)
+
+    assert grab_micro_gds.rate_limit_delay(_response(403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset})) > 0
+    assert grab_micro_gds.rate_limit_delay(_response(403, {"Retry-After": "5"})) == 5
+    assert grab_micro_gds.rate_limit_delay(_response(403, {"X-RateLimit-Remaining": "4000", "X-RateLimit-Reset": reset})) is None
+
+
+def test_process_one_stops_when_download_fails(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "tt_um_micro1.v").write_text("module stale;\nendmodule\n")
+    monkeypatch.setattr(grab_micro_gds, "download_and_extract", lambda *args: False)
+
+    with pytest.raises(RuntimeError, match="Failed to fetch tt_submission"):
+        grab_micro_gds.process_one("https://github.com/user/repo", "tt_um_micro1")
+
+    assert (tmp_path / "tt_um_micro1.v").read_text() == "module stale;\nendmodule\n"
+
+
+@pytest.fixture
+def rate_limited_server():
+    requests_seen = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(self.path)
+            body = b"payload"
+            if len(requests_seen) == 1:
+                self.send_response(403)
+                self.send_header("Retry-After", "0")
+                body = b"rate limited"
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/artifact", requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_session_resends_rate_limited_request(rate_limited_server, stream):
+    url, requests_seen = rate_limited_server
+
+    response = grab_micro_gds.SESSION.get(url, stream=stream)
+
+    assert response.status_code == 200
+    assert b"".join(response.iter_content(chunk_size=1024)) == b"payload"
+    assert requests_seen == ["/artifact", "/artifact"]